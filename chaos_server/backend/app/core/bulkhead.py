@@ -0,0 +1,58 @@
+"""Bulkheads: cap how many attacks run against one target at a time."""
+import asyncio
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Bulkhead:
+    """
+    At most `max_concurrent` attacks run at once; up to `max_queued` more wait
+    for a slot. Beyond that, try_reserve() fails so the endpoint can reject the
+    request instead of piling up background tasks, sockets and DB connections.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 16, on_idle: Optional[Callable[[], None]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.pending = 0  # running + waiting
+        self._sem = asyncio.Semaphore(max_concurrent)
+        # Called whenever pending drops back to 0
+        self._on_idle = on_idle
+
+    def try_reserve(self) -> bool:
+        """Claim a running or queued place; every True must be followed by run()."""
+        if self.pending >= self.max_concurrent + self.max_queued:
+            return False
+        self.pending += 1
+        return True
+
+    async def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run `coro` once a slot is free, then give the reservation back."""
+        try:
+            async with self._sem:
+                return await coro
+        finally:
+            # No-op once the coroutine has run; avoids a "never awaited"
+            # warning if we were cancelled while still queued
+            coro.close()
+            self.pending -= 1
+            if self.pending == 0 and self._on_idle is not None:
+                self._on_idle()
+
+
+def get_bulkhead(bulkheads: dict[str, Bulkhead], target: str) -> Bulkhead:
+    """
+    Get the bulkhead for `target` from a module's registry, creating it on first
+    use. It removes itself from the registry once it has nothing running or
+    queued, so the registry only holds targets under attack. `target` should be
+    normalized by the caller, or spellings of the same target get separate budgets.
+    """
+    bulkhead = bulkheads.get(target)
+    if bulkhead is None:
+        def forget() -> None:
+            if bulkheads.get(target) is bulkhead:
+                del bulkheads[target]
+
+        bulkhead = bulkheads[target] = Bulkhead(on_idle=forget)
+    return bulkhead
@@ -1,3 +1,4 @@
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
 
@@ -20,6 +21,10 @@ class Settings(BaseSettings):
     # Server
     host: str = "0.0.0.0"
     port: int = 8080
+    # WORKERS, or WEB_CONCURRENCY as set by most PaaS/container platforms.
+    # Ignored when debug (reload) is on. Attack registries are per-process,
+    # so with more than one worker a status/stop call can miss its attack.
+    workers: int = Field(default=1, ge=1, validation_alias=AliasChoices("workers", "web_concurrency"))
 
     # Target server (victim) base URL
     # Example (docker-compose bridge): http://target_server_api:8000
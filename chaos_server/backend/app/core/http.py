@@ -0,0 +1,16 @@
+"""Shared HTTP client for calls to the target server."""
+import httpx
+from fastapi import Request
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the app-wide client; keep-alive connections are reused across attacks."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(5.0),
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+    )
+
+
+def get_http(request: Request) -> httpx.AsyncClient:
+    """FastAPI dependency returning the app-wide HTTP client."""
+    return request.app.state.http
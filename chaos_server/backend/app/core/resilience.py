@@ -0,0 +1,119 @@
+"""Retry and circuit-breaker helpers for HTTP calls to the target server."""
+import time
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+# Responses worth retrying; any other 4xx is the caller's fault and is returned as-is
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the target's circuit is open."""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    CLOSED: calls go through. After `failure_threshold` consecutive failures the
+    circuit goes OPEN and calls are refused for `reset_timeout` seconds. Then it
+    goes HALF_OPEN and lets a single trial call through: success closes the
+    circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def release(self) -> None:
+        """Give back a half-open trial slot without recording an outcome (e.g. on cancellation)."""
+        self._trial_in_flight = False
+
+    def record(self, success: bool) -> None:
+        self._trial_in_flight = False
+        if success:
+            self.state = self.CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+# One breaker per target host
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(url: httpx.URL | str) -> CircuitBreaker:
+    """Get the circuit breaker for the host of `url`."""
+    parsed = httpx.URL(url)
+    key = f"{parsed.host}:{parsed.port}"
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker()
+    return breaker
+
+
+async def request_with_retry(client: httpx.AsyncClient, method: str, url: httpx.URL | str, **kwargs) -> httpx.Response:
+    """
+    Send a request, retrying network errors and 429/5xx responses up to 3 attempts
+    with full-jitter exponential backoff, behind the target host's circuit breaker.
+
+    Raises CircuitOpenError without sending anything while the circuit is open.
+    A 429/5xx that persists through all attempts is returned, not raised.
+    """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for {httpx.URL(url).host}; target is failing, not retrying yet")
+
+    try:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_random_exponential(multiplier=0.2, max=2.0),
+            retry=retry_if_exception_type((httpx.TransportError, _RetryableStatus)),
+            reraise=True,
+        ):
+            with attempt:
+                response = await client.request(method, url, **kwargs)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    raise _RetryableStatus(response)
+    except _RetryableStatus as e:
+        # A 429 means the target is up and throttling us; only 5xx counts against it
+        breaker.record(success=e.response.status_code < 500)
+        return e.response
+    except Exception:
+        breaker.record(success=False)
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+
+    breaker.record(success=True)
+    return response
@@ -0,0 +1,37 @@
+"""Attack timestamps: wall clock for display, monotonic for durations."""
+import threading
+import time
+from typing import Any, Optional
+
+from cachetools import TTLCache
+
+
+class AttackClock:
+    """
+    Stamps `started_at` / `finished_at` on attack records with wall-clock time,
+    and keeps monotonic readings of the same moments (outside the record) so
+    durations can't be skewed or go negative when the system clock is stepped.
+    """
+
+    def __init__(self):
+        # attack_id -> {field: monotonic time}; expires with the attack records
+        self._marks: TTLCache[str, dict[str, float]] = TTLCache(maxsize=10_000, ttl=86400)
+        # TTLCache isn't thread-safe, and some attacks mark from worker threads
+        # while the event loop reads
+        self._lock = threading.Lock()
+
+    def mark(self, attack: dict[str, Any], field: str) -> None:
+        attack[field] = time.time()
+        now = time.monotonic()
+        with self._lock:
+            self._marks.setdefault(attack["id"], {})[field] = now
+
+    def elapsed(self, attack_id: str) -> Optional[float]:
+        """Seconds from started_at to finished_at (or to now if still running); None if not started."""
+        with self._lock:
+            marks = self._marks.get(attack_id)
+            if not marks or "started_at" not in marks:
+                return None
+            started_at = marks["started_at"]
+            finished_at = marks.get("finished_at")
+        return (finished_at if finished_at is not None else time.monotonic()) - started_at
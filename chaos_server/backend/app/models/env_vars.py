@@ -0,0 +1,9 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class EnvVarBreak(BaseModel):
+    env_var_name: str
+    failure_type: str = Field(default="missing", pattern="^(missing|wrong)$")
+    wrong_value: Optional[str] = None
@@ -8,11 +8,13 @@ import httpx
 from fastapi import APIRouter, HTTPException, Query
 
 from app.core.config import settings
+from app.core.timing import AttackClock
 
 router = APIRouter()
 
 # In-memory attack registry
 _attacks: dict[str, dict[str, Any]] = {}
+_clock = AttackClock()
 
 
 def _get_container_name() -> str:
@@ -112,7 +114,7 @@ async def _run_attack(
 ) -> None:
     """Run the API crash attack."""
     _attacks[attack_id]["state"] = "running"
-    _attacks[attack_id]["started_at"] = time.time()
+    _clock.mark(_attacks[attack_id], "started_at")
     
     try:
         # Check if container exists and is running
@@ -120,7 +122,7 @@ async def _run_attack(
         if not is_running:
             _attacks[attack_id]["state"] = "failed"
             _attacks[attack_id]["error"] = f"Container {container_name} is not running"
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
             return
         
         _attacks[attack_id]["container_was_running"] = True
@@ -132,7 +134,7 @@ async def _run_attack(
             if not result["success"]:
                 _attacks[attack_id]["state"] = "failed"
                 _attacks[attack_id]["error"] = result.get("error", "Failed to stop container")
-                _attacks[attack_id]["finished_at"] = time.time()
+                _clock.mark(_attacks[attack_id], "finished_at")
                 return
             
             # Verify API is down
@@ -164,7 +166,7 @@ async def _run_attack(
             if not result["success"]:
                 _attacks[attack_id]["state"] = "failed"
                 _attacks[attack_id]["error"] = result.get("error", "Failed to restart container")
-                _attacks[attack_id]["finished_at"] = time.time()
+                _clock.mark(_attacks[attack_id], "finished_at")
                 return
             
             # Verify API comes back up
@@ -173,12 +175,12 @@ async def _run_attack(
             _attacks[attack_id]["api_verified_up"] = is_up
             _attacks[attack_id]["state"] = "completed" if is_up else "partially_recovered"
         
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
         
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
 
 
 @router.post("/break/api_crash")
@@ -239,19 +241,8 @@ async def break_api_crash_status(attack_id: str):
     if not attack:
         raise HTTPException(status_code=404, detail="Unknown attack_id")
     
-    # Calculate duration if attack is running
-    duration = None
-    if attack.get("started_at") and not attack.get("finished_at"):
-        duration = time.time() - attack["started_at"]
-    elif attack.get("started_at") and attack.get("finished_at"):
-        duration = attack["finished_at"] - attack["started_at"]
-    
-    response = {
-        k: v for k, v in attack.items()
-        if k not in []  # No sensitive data to exclude
-    }
-    response["duration_seconds"] = duration
-    return response
+    # Elapsed so far if running, total once finished (monotonic, see AttackClock)
+    return {**attack, "duration_seconds": _clock.elapsed(attack_id)}
 
 
 @router.post("/break/api_crash/{attack_id}/stop")
@@ -287,6 +278,6 @@ async def break_api_crash_stop(attack_id: str):
     else:
         attack["state"] = "cancelled"
     
-    attack["finished_at"] = time.time()
+    _clock.mark(attack, "finished_at")
     return {"status": "stopped", "attack_id": attack_id, "state": attack["state"]}
 
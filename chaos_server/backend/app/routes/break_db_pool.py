@@ -4,6 +4,7 @@ import uuid
 from typing import Any
 
 import httpx
+import orjson
 from fastapi import APIRouter, HTTPException, Query
 
 from app.core.config import settings
@@ -19,7 +20,7 @@ async def _hold_one(client: httpx.AsyncClient, target_base_url: str, seconds: in
     resp = await client.post(url, params={"seconds": seconds})
     return {
         "status_code": resp.status_code,
-        "body": resp.json()
+        "body": orjson.loads(resp.content)
         if resp.headers.get("content-type", "").startswith("application/json")
         else resp.text,
     }
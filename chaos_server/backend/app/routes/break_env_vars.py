@@ -1,17 +1,38 @@
 import asyncio
+import functools
+import io
+import json
 import time
 import uuid
 from pathlib import Path
-from shutil import copy
+from shutil import copyfile
 from typing import Any, Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException, Query
+import orjson
+from dotenv.parser import parse_stream
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from app.core.config import settings
+from app.models.env_vars import EnvVarBreak
 
 router = APIRouter()
+
+# In-memory attack registry. _attacks holds the public view returned by the
+# status endpoint; fields that must not be exposed (backup paths) live in
+# _attack_private so status polls can return the record without copying it.
 _attacks: dict[str, dict[str, Any]] = {}
+_attack_private: dict[str, dict[str, Any]] = {}
+
+# Event-stream subscribers per attack; each state change is pushed to every queue
+_attack_queues: dict[str, list[asyncio.Queue]] = {}
+
+# States after which an attack can no longer change
+_FINAL_STATES = frozenset({"failed", "rolled_back", "rollback_failed"})
+
+# Upper bound for a rollback triggered by cancellation or shutdown
+_ROLLBACK_TIMEOUT_SECONDS = 15
 
 
 def find_workspace_root() -> Path:
@@ -36,73 +57,97 @@ def find_workspace_root() -> Path:
     return Path.cwd()
 
 
-def modify_env_file(env_file_path: str, var_name: str, new_value: Optional[str] = None) -> tuple[Optional[str], Optional[str]]:
+def modify_env_vars(env_file_path: str, changes: dict[str, Optional[str]]) -> tuple[Optional[str], dict[str, Optional[str]]]:
     """
-    Modify an .env file by setting, changing, or removing a variable.
+    Modify an .env file by setting, changing, or removing several variables in one pass.
     
     Args:
         env_file_path: Path to the .env file
-        var_name: Name of the environment variable
-        new_value: New value to set (None = remove the variable)
+        changes: Mapping of variable name -> new value (None = remove the variable)
     
     Returns:
-        (backup_path, original_value) - path to backup file and original value if it existed
+        (backup_path, original_values) - path to backup file and the original values
+        of the variables that existed
     """
     env_path = Path(env_file_path)
     
+    original_values: dict[str, Optional[str]] = {}
+
+    # Read current content once (used for both the backup and the modification)
+    try:
+        content = env_path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        content = None
+
     # Backup original file
-    backup_path = None
-    original_value = None
-    
-    if env_path.exists():
+    if content is not None:
         backup_path = str(env_path) + ".backup"
-        with open(env_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-    
-    # Read current content
-    lines = []
-    if env_path.exists():
-        with open(env_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    
-    # Find and update/remove the variable
-    found = False
+        Path(backup_path).write_text(content, encoding='utf-8')
+    else:
+        backup_path = None
+
+    # Find and update/remove the variables. python-dotenv's parser understands
+    # quoting, escapes, multiline values and `export` prefixes; every binding we
+    # don't touch (including comments and blank lines) is written back verbatim.
+    found = set()
     new_lines = []
-    for line in lines:
-        stripped = line.strip()
-        # Handle both VAR=value and VAR = value formats, and ignore comments
-        if not stripped.startswith('#') and (stripped.startswith(f"{var_name}=") or stripped.startswith(f"{var_name} =")):
-            found = True
-            if '=' in line:
-                original_value = line.split('=', 1)[1].strip()
-                # Remove quotes if present
-                if original_value.startswith('"') and original_value.endswith('"'):
-                    original_value = original_value[1:-1]
-                elif original_value.startswith("'") and original_value.endswith("'"):
-                    original_value = original_value[1:-1]
+    for binding in parse_stream(io.StringIO(content or "")):
+        if binding.key in changes:
+            var_name = binding.key
+            found.add(var_name)
+            original_values[var_name] = binding.value
             # Don't add this line if we're removing it (new_value is None)
+            new_value = changes[var_name]
             if new_value is not None:
                 new_lines.append(f"{var_name}={new_value}\n")
         else:
-            new_lines.append(line)
+            new_lines.append(binding.original.string)
     
-    # If variable wasn't found, add it (unless we're removing it)
-    if not found and new_value is not None:
+    # If a variable wasn't found, add it (unless we're removing it)
+    missing = [(k, v) for k, v in changes.items() if k not in found and v is not None]
+    if missing and new_lines and not new_lines[-1].endswith("\n"):
+        new_lines[-1] += "\n"
+    for var_name, new_value in missing:
         new_lines.append(f"{var_name}={new_value}\n")
     
-    # Write modified content
-    with open(env_path, 'w', encoding='utf-8') as f:
-        f.writelines(new_lines)
+    # Write modified content in a single write
+    env_path.write_text("".join(new_lines), encoding='utf-8')
     
-    return backup_path, original_value
+    return backup_path, original_values
+
+
+def modify_env_file(env_file_path: str, var_name: str, new_value: Optional[str] = None) -> tuple[Optional[str], Optional[str]]:
+    """
+    Modify an .env file by setting, changing, or removing a variable.
+    
+    Args:
+        env_file_path: Path to the .env file
+        var_name: Name of the environment variable
+        new_value: New value to set (None = remove the variable)
+    
+    Returns:
+        (backup_path, original_value) - path to backup file and original value if it existed
+    """
+    backup_path, original_values = modify_env_vars(env_file_path, {var_name: new_value})
+    return backup_path, original_values.get(var_name)
 
 
 def restore_env_file(env_file_path: str, backup_path: Optional[str]) -> None:
-    """Restore .env file from backup."""
+    """
+    Restore .env file from backup.
+
+    Only the file contents are copied back; permission bits are not restored
+    from the backup. The .env file keeps the mode it was originally written with.
+    """
     if backup_path and Path(backup_path).exists():
-        copy(backup_path, env_file_path)
+        copyfile(backup_path, env_file_path)
+
+
+@functools.lru_cache(maxsize=16)
+def _resolve_compose(compose_file: str) -> tuple[str, str]:
+    """Resolve a compose file path once, returning (absolute file, absolute directory)."""
+    compose_file_path = Path(compose_file).resolve()
+    return str(compose_file_path), str(compose_file_path.parent)
 
 
 async def restart_container(compose_file: str, service: str = "api") -> dict:
@@ -119,10 +164,8 @@ async def restart_container(compose_file: str, service: str = "api") -> dict:
     import sys
     import subprocess
     
-    compose_file_path = Path(compose_file).resolve()
-    compose_dir = compose_file_path.parent
     # Use absolute path for -f flag to avoid any path resolution issues
-    compose_file_abs = str(compose_file_path)
+    compose_file_abs, compose_dir = _resolve_compose(compose_file)
     
     # Build command - use absolute path for compose file
     command = ["docker", "compose", "-f", compose_file_abs, "restart", service]
@@ -132,7 +175,7 @@ async def restart_container(compose_file: str, service: str = "api") -> dict:
         try:
             result = subprocess.run(
                 command,
-                cwd=str(compose_dir),
+                cwd=compose_dir,
                 capture_output=True,
                 text=True,
                 timeout=60
@@ -173,32 +216,50 @@ async def restart_container(compose_file: str, service: str = "api") -> dict:
         }
 
 
+def _publish(attack_id: str) -> None:
+    """Push a snapshot of the attack record to its event-stream subscribers."""
+    queues = _attack_queues.get(attack_id)
+    if queues:
+        snapshot = dict(_attacks[attack_id])
+        for queue in queues:
+            queue.put_nowait(snapshot)
+
+
+def _env_change(failure_type: str, wrong_value: Optional[str]) -> Optional[str]:
+    """Return the new value for a variable (None = remove it) for the given failure type."""
+    if failure_type == "missing":
+        return None
+    return wrong_value or "INVALID_VALUE_12345"
+
+
 async def _run_attack(
     attack_id: str,
     target_env_file: str,
-    env_var_name: str,
-    failure_type: str,
-    wrong_value: Optional[str],
+    changes: dict[str, Optional[str]],
     compose_file: str,
     duration_seconds: Optional[int],
-    target_api_base_url: str
+    target_api_base_url: str,
+    batch: bool = False,
 ) -> None:
     """Run the env var chaos attack."""
     _attacks[attack_id]["state"] = "running"
     _attacks[attack_id]["started_at"] = time.time()
+    _publish(attack_id)
     
     try:
-        # Step 1: Backup and modify .env
-        if failure_type == "missing":
-            backup_path, original_value = modify_env_file(target_env_file, env_var_name, new_value=None)
-            _attacks[attack_id]["action"] = f"Removed {env_var_name}"
-        else:  # wrong
-            wrong_val = wrong_value or "INVALID_VALUE_12345"
-            backup_path, original_value = modify_env_file(target_env_file, env_var_name, new_value=wrong_val)
-            _attacks[attack_id]["action"] = f"Set {env_var_name}={wrong_val}"
+        # Step 1: Backup and modify .env (all variables in a single read/write)
+        backup_path, original_values = modify_env_vars(target_env_file, changes)
+        _attacks[attack_id]["action"] = "; ".join(
+            f"Removed {name}" if value is None else f"Set {name}={value}"
+            for name, value in changes.items()
+        )
         
-        _attacks[attack_id]["backup_path"] = backup_path
-        _attacks[attack_id]["original_value"] = original_value
+        _attack_private[attack_id]["backup_path"] = backup_path
+        if batch:
+            _attacks[attack_id]["original_values"] = original_values
+        else:
+            (env_var_name,) = changes
+            _attacks[attack_id]["original_value"] = original_values.get(env_var_name)
         
         # Step 2: Restart container to pick up changes
         restart_result = await restart_container(compose_file, service="api")
@@ -230,7 +291,7 @@ async def _run_attack(
                 resp = await client.get(url)
                 _attacks[attack_id]["test_endpoint_status"] = resp.status_code
                 try:
-                    _attacks[attack_id]["test_endpoint_response"] = resp.json()
+                    _attacks[attack_id]["test_endpoint_response"] = orjson.loads(resp.content)
                 except Exception:
                     _attacks[attack_id]["test_endpoint_response"] = resp.text[:200]
         except Exception as e:
@@ -244,11 +305,59 @@ async def _run_attack(
         else:
             _attacks[attack_id]["state"] = "completed"
             _attacks[attack_id]["finished_at"] = time.time()
+            _publish(attack_id)
+    
+    except asyncio.CancelledError:
+        # The worker is going away mid-attack: don't leave the .env broken.
+        # Shield the rollback so a second cancellation can't interrupt it halfway.
+        if _attacks[attack_id]["state"] not in _FINAL_STATES:
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(_rollback_attack(attack_id, target_env_file, compose_file)),
+                    timeout=_ROLLBACK_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                pass
+        raise
     
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
         _attacks[attack_id]["finished_at"] = time.time()
+        _publish(attack_id)
+
+
+async def rollback_active_attacks() -> None:
+    """
+    Undo every attack that still leaves the target broken (called on shutdown).
+
+    Unfinished attack tasks are cancelled and roll themselves back (see
+    _run_attack). Attacks that completed without a duration are still broken,
+    and their backup path only lives in this process, so they're rolled back here.
+    """
+    tasks = [
+        private["task"] for private in list(_attack_private.values())
+        if "task" in private and not private["task"].done()
+    ]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.wait(tasks, timeout=_ROLLBACK_TIMEOUT_SECONDS)
+    
+    completed = [
+        (attack_id, attack) for attack_id, attack in list(_attacks.items())
+        if attack["state"] == "completed" and _attack_private.get(attack_id, {}).get("backup_path")
+    ]
+    await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                _rollback_attack(attack_id, attack["target_env_file"], attack["compose_file"]),
+                timeout=_ROLLBACK_TIMEOUT_SECONDS,
+            )
+            for attack_id, attack in completed
+        ),
+        return_exceptions=True,
+    )
 
 
 async def _rollback_attack(attack_id: str, target_env_file: str, compose_file: str) -> None:
@@ -258,7 +367,7 @@ async def _rollback_attack(attack_id: str, target_env_file: str, compose_file: s
         return
     
     try:
-        backup_path = attack.get("backup_path")
+        backup_path = _attack_private.get(attack_id, {}).get("backup_path")
         if backup_path:
             restore_env_file(target_env_file, backup_path)
             restart_result = await restart_container(compose_file, service="api")
@@ -270,14 +379,39 @@ async def _rollback_attack(attack_id: str, target_env_file: str, compose_file: s
         _attacks[attack_id]["state"] = "rolled_back"
         _attacks[attack_id]["rolled_back_at"] = time.time()
         _attacks[attack_id]["finished_at"] = time.time()
+        _publish(attack_id)
     
     except Exception as e:
         _attacks[attack_id]["state"] = "rollback_failed"
         _attacks[attack_id]["rollback_error"] = str(e)
         _attacks[attack_id]["finished_at"] = time.time()
+        _publish(attack_id)
         raise
 
 
+def _resolve_target_paths(target_env_file: Optional[str], compose_file: Optional[str]) -> tuple[Path, Path]:
+    """Resolve the .env and compose file paths, falling back to settings and the workspace root."""
+    # Use defaults from settings if not provided
+    effective_env_file = target_env_file or settings.target_env_file
+    effective_compose_file = compose_file or settings.target_compose_file
+    
+    # Resolve paths (make absolute if relative)
+    env_path = Path(effective_env_file)
+    compose_path = Path(effective_compose_file)
+    
+    if not env_path.is_absolute():
+        # Resolve relative to workspace root
+        workspace_root = find_workspace_root()
+        env_path = workspace_root / env_path
+    
+    if not compose_path.is_absolute():
+        # Resolve relative to workspace root
+        workspace_root = find_workspace_root()
+        compose_path = workspace_root / compose_path
+    
+    return env_path, compose_path
+
+
 @router.post("/break/env_vars")
 async def break_env_vars(
     target_env_file: Optional[str] = Query(default=None, description="Path to target server .env file (defaults to settings.target_env_file)"),
@@ -303,24 +437,7 @@ async def break_env_vars(
     """
     attack_id = str(uuid.uuid4())
     effective_api_url = target_api_base_url or settings.target_api_base_url
-    
-    # Use defaults from settings if not provided
-    effective_env_file = target_env_file or settings.target_env_file
-    effective_compose_file = compose_file or settings.target_compose_file
-    
-    # Resolve paths (make absolute if relative)
-    env_path = Path(effective_env_file)
-    compose_path = Path(effective_compose_file)
-    
-    if not env_path.is_absolute():
-        # Resolve relative to workspace root
-        workspace_root = find_workspace_root()
-        env_path = workspace_root / env_path
-    
-    if not compose_path.is_absolute():
-        # Resolve relative to workspace root
-        workspace_root = find_workspace_root()
-        compose_path = workspace_root / compose_path
+    env_path, compose_path = _resolve_target_paths(target_env_file, compose_file)
     
     _attacks[attack_id] = {
         "id": attack_id,
@@ -333,15 +450,58 @@ async def break_env_vars(
         "duration_seconds": duration_seconds,
         "created_at": time.time(),
     }
+    _attack_private[attack_id] = {}
     
-    asyncio.create_task(_run_attack(
-        attack_id, str(env_path), env_var_name, failure_type, wrong_value,
+    # Kept so shutdown can cancel it before rolling back
+    _attack_private[attack_id]["task"] = asyncio.create_task(_run_attack(
+        attack_id, str(env_path), {env_var_name: _env_change(failure_type, wrong_value)},
         str(compose_path), duration_seconds, effective_api_url
     ))
     
     return {"status": "started", "attack_id": attack_id}
 
 
+@router.post("/break/env_vars/batch")
+async def break_env_vars_batch(
+    env_vars: list[EnvVarBreak] = Body(..., min_length=1, description="Environment variables to break in a single attack"),
+    target_env_file: Optional[str] = Query(default=None, description="Path to target server .env file (defaults to settings.target_env_file)"),
+    compose_file: Optional[str] = Query(default=None, description="Path to docker-compose.yml (defaults to settings.target_compose_file)"),
+    duration_seconds: Optional[int] = Query(default=None, ge=1, le=3600, description="Auto-rollback after this many seconds (None = manual rollback required)"),
+    target_api_base_url: Optional[str] = Query(default=None, description="Target server API base URL (optional, defaults to settings)"),
+):
+    """
+    Break several environment variables at once with a single .env rewrite and
+    a single container restart.
+    
+    All variables are backed up together, so rollback (auto or via /stop)
+    restores every one of them in one step.
+    """
+    attack_id = str(uuid.uuid4())
+    effective_api_url = target_api_base_url or settings.target_api_base_url
+    env_path, compose_path = _resolve_target_paths(target_env_file, compose_file)
+    
+    changes = {v.env_var_name: _env_change(v.failure_type, v.wrong_value) for v in env_vars}
+    
+    _attacks[attack_id] = {
+        "id": attack_id,
+        "state": "starting",
+        "target_env_file": str(env_path),
+        "compose_file": str(compose_path),
+        "env_vars": [v.model_dump() for v in env_vars],
+        "duration_seconds": duration_seconds,
+        "created_at": time.time(),
+    }
+    _attack_private[attack_id] = {}
+    
+    # Kept so shutdown can cancel it before rolling back
+    _attack_private[attack_id]["task"] = asyncio.create_task(_run_attack(
+        attack_id, str(env_path), changes,
+        str(compose_path), duration_seconds, effective_api_url, batch=True
+    ))
+    
+    return {"status": "started", "attack_id": attack_id}
+
+
 @router.get("/break/env_vars/{attack_id}")
 async def break_env_vars_status(attack_id: str):
     """Get the status of an env vars chaos attack."""
@@ -349,9 +509,41 @@ async def break_env_vars_status(attack_id: str):
     if not attack:
         raise HTTPException(status_code=404, detail="Unknown attack_id")
     
-    # Don't expose backup paths in response (but keep in memory for rollback)
-    response = {k: v for k, v in attack.items() if k != "backup_path"}
-    return response
+    # Backup paths are kept in _attack_private, so the record is safe to return as-is
+    return attack
+
+
+@router.get("/break/env_vars/{attack_id}/events")
+async def break_env_vars_events(attack_id: str):
+    """
+    Stream state changes of an env vars chaos attack as Server-Sent Events.
+    
+    The current record is sent immediately, followed by one event per state
+    transition. The stream ends once the attack reaches a final state.
+    """
+    attack = _attacks.get(attack_id)
+    if not attack:
+        raise HTTPException(status_code=404, detail="Unknown attack_id")
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    _attack_queues.setdefault(attack_id, []).append(queue)
+    queue.put_nowait(dict(attack))
+    
+    async def event_stream():
+        try:
+            while True:
+                msg = await queue.get()
+                yield f"data: {json.dumps(msg)}\n\n"
+                if msg.get("state") in _FINAL_STATES:
+                    break
+        finally:
+            queues = _attack_queues.get(attack_id)
+            if queues:
+                queues.remove(queue)
+                if not queues:
+                    del _attack_queues[attack_id]
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.post("/break/env_vars/{attack_id}/stop")
@@ -9,11 +9,16 @@ from fastapi import APIRouter, HTTPException, Query
 from psycopg2.extensions import ISOLATION_LEVEL_READ_COMMITTED
 
 from app.core.config import settings
+from app.core.timing import AttackClock
 
 router = APIRouter()
 
 # In-memory attack registry
+# _attacks holds the public view returned by the status endpoint; the database
+# URL and the stop event live in _attack_private so it can be returned as-is.
 _attacks: dict[str, dict[str, Any]] = {}
+_attack_private: dict[str, dict[str, Any]] = {}
+_clock = AttackClock()
 
 # Thread-safe connection storage for long-running transactions
 _connections: dict[str, tuple[psycopg2.extensions.connection, threading.Thread]] = {}
@@ -126,7 +131,7 @@ def _run_table_lock_attack(
         
         _attacks[attack_id]["backend_pid"] = pid
         _attacks[attack_id]["state"] = "running"
-        _attacks[attack_id]["started_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "started_at")
         
         with conn.cursor() as cur:
             # Begin transaction
@@ -169,12 +174,12 @@ def _run_table_lock_attack(
                 cur.execute(SQL_ROLLBACK)
                 _attacks[attack_id]["state"] = "rolled_back"
             
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
     
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
     
     finally:
         if conn and not conn.closed:
@@ -200,7 +205,7 @@ def _run_row_lock_attack(
         
         _attacks[attack_id]["backend_pid"] = pid
         _attacks[attack_id]["state"] = "running"
-        _attacks[attack_id]["started_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "started_at")
         
         with conn.cursor() as cur:
             # Begin transaction
@@ -241,12 +246,12 @@ def _run_row_lock_attack(
                 cur.execute(SQL_ROLLBACK)
                 _attacks[attack_id]["state"] = "rolled_back"
             
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
     
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
     
     finally:
         if conn and not conn.closed:
@@ -271,7 +276,7 @@ def _run_advisory_lock_attack(
         
         _attacks[attack_id]["backend_pid"] = pid
         _attacks[attack_id]["state"] = "running"
-        _attacks[attack_id]["started_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "started_at")
         
         with conn.cursor() as cur:
             # Begin transaction
@@ -312,12 +317,12 @@ def _run_advisory_lock_attack(
                 cur.execute(SQL_ROLLBACK)
                 _attacks[attack_id]["state"] = "rolled_back"
             
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
     
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
     
     finally:
         if conn and not conn.closed:
@@ -386,15 +391,17 @@ async def break_long_transactions(
     _attacks[attack_id] = {
         "id": attack_id,
         "state": "starting",
-        "target_database_url": target_database_url,
         "lock_type": lock_type,
         "duration_seconds": duration_seconds,
         "target_table": target_table if lock_type in ["table_lock", "row_lock"] else None,
         "lock_count": lock_count if lock_type in ["row_lock", "advisory_lock"] else None,
         "advisory_lock_id": advisory_lock_id if lock_type == "advisory_lock" else None,
-        "stop_event": stop_event,
         "created_at": time.time(),
     }
+    _attack_private[attack_id] = {
+        "target_database_url": target_database_url,
+        "stop_event": stop_event,
+    }
     
     # Start attack in background thread based on lock type
     thread = None
@@ -438,11 +445,10 @@ async def break_long_transactions_status(attack_id: str):
     
     # Calculate elapsed time if running
     if attack.get("started_at") and attack["state"] in ["running", "starting"]:
-        attack["elapsed_seconds"] = time.time() - attack["started_at"]
+        attack["elapsed_seconds"] = _clock.elapsed(attack_id)
     
-    # Don't expose sensitive database URLs in response
-    response = {k: v for k, v in attack.items() if k not in ["target_database_url", "stop_event"]}
-    return response
+    # The database URL and stop event are kept in _attack_private, so the record is safe to return as-is
+    return attack
 
 
 @router.post("/break/long_transactions/{attack_id}/stop")
@@ -466,7 +472,8 @@ async def break_long_transactions_stop(
         }
     
     # Signal the thread to stop
-    stop_event = attack.get("stop_event")
+    private = _attack_private.get(attack_id, {})
+    stop_event = private.get("stop_event")
     if stop_event:
         stop_event.set()
     
@@ -480,11 +487,12 @@ async def break_long_transactions_stop(
         if force_kill:
             backend_pid = attack.get("backend_pid")
             if backend_pid:
-                target_database_url = attack.get("target_database_url", settings.target_database_url)
-                killed = _kill_backend_pid(target_database_url, backend_pid)
+                target_database_url = private.get("target_database_url", settings.target_database_url)
+                # psycopg2 is blocking; keep it off the event loop
+                killed = await asyncio.to_thread(_kill_backend_pid, target_database_url, backend_pid)
                 if killed:
                     attack["state"] = "force_killed"
-                    attack["finished_at"] = time.time()
+                    _clock.mark(attack, "finished_at")
                     attack["force_killed"] = True
                     return {
                         "status": "force_killed",
@@ -499,7 +507,7 @@ async def break_long_transactions_stop(
             return {
                 "status": "rolled_back",
                 "attack_id": attack_id,
-                "elapsed_seconds": attack.get("finished_at", time.time()) - attack.get("started_at", time.time())
+                "elapsed_seconds": _clock.elapsed(attack_id)
             }
         elif attack["state"] == "completed":
             return {
@@ -1,33 +1,64 @@
 import asyncio
+import functools
 import time
 import uuid
 from typing import Any, Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException, Query
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Query
 
+from app.core.bulkhead import Bulkhead, get_bulkhead
 from app.core.config import settings
+from app.core.http import get_http
+from app.core.resilience import request_with_retry
+from app.core.timing import AttackClock
 
 router = APIRouter()
 
-# In-memory attack registry
-_attacks: dict[str, dict[str, Any]] = {}
+# In-memory attack registry. Bounded, and entries expire a day after they
+# were created so finished attacks don't accumulate for the life of the process.
+_attacks: TTLCache[str, dict[str, Any]] = TTLCache(maxsize=10_000, ttl=86400)
+_clock = AttackClock()
 
+# Concurrent attacks per target base URL
+_bulkheads: dict[str, Bulkhead] = {}
 
-async def _get_current_config(target_base_url: str) -> dict:
+# Per-request timeout for flood requests (the shared client defaults to 5s)
+_FLOOD_TIMEOUT = httpx.Timeout(10.0)
+
+
+@functools.lru_cache(maxsize=32)
+def _target_key(target_base_url: str) -> str:
+    """Normalized scheme://host:port of a target, so every spelling shares one bulkhead."""
+    try:
+        url = _target_url(target_base_url, "/")
+    except httpx.InvalidURL:
+        return target_base_url
+    port = url.port or (443 if url.scheme == "https" else 80)
+    return f"{url.scheme}://{url.host}:{port}"
+
+
+@functools.lru_cache(maxsize=32)
+def _target_url(target_base_url: str, path: str) -> httpx.URL:
+    """Build (once per base URL and path) the parsed URL of a target endpoint."""
+    return httpx.URL(f"{target_base_url.rstrip('/')}{path}")
+
+
+async def _get_current_config(client: httpx.AsyncClient, target_base_url: str) -> dict:
     """Get current rate limit configuration from target server."""
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-            response = await client.get(f"{target_base_url.rstrip('/')}/api/v1/rate_limit/config")
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("config", {})
-            return {}
+        response = await request_with_retry(client, "GET", _target_url(target_base_url, "/api/v1/rate_limit/config"))
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            return data.get("config", {})
+        return {}
     except Exception as e:
         raise Exception(f"Failed to get current config: {str(e)}")
 
 
-async def _update_config(target_base_url: str, enabled: bool = None, max_requests: int = None, window_seconds: int = None) -> dict:
+async def _update_config(client: httpx.AsyncClient, target_base_url: str, enabled: bool = None, max_requests: int = None, window_seconds: int = None) -> dict:
     """Update rate limit configuration on target server."""
     try:
         payload = {}
@@ -38,43 +69,45 @@ async def _update_config(target_base_url: str, enabled: bool = None, max_request
         if window_seconds is not None:
             payload["window_seconds"] = window_seconds
         
-        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-            response = await client.post(
-                f"{target_base_url.rstrip('/')}/api/v1/rate_limit/config",
-                json=payload
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("config", {})
-            else:
-                raise Exception(f"Failed to update config: {response.status_code} - {response.text}")
+        response = await request_with_retry(
+            client,
+            "POST",
+            _target_url(target_base_url, "/api/v1/rate_limit/config"),
+            json=payload
+        )
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            return data.get("config", {})
+        else:
+            raise Exception(f"Failed to update config: {response.status_code} - {response.text}")
     except Exception as e:
         raise Exception(f"Failed to update config: {str(e)}")
 
 
-async def _get_stats(target_base_url: str) -> dict:
+async def _get_stats(client: httpx.AsyncClient, target_base_url: str) -> dict:
     """Get rate limit statistics from target server."""
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-            response = await client.get(f"{target_base_url.rstrip('/')}/api/v1/rate_limit/stats")
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("stats", {})
-            return {}
+        response = await request_with_retry(client, "GET", _target_url(target_base_url, "/api/v1/rate_limit/stats"))
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            return data.get("stats", {})
+        return {}
     except Exception:
         return {}
 
 
-async def _send_request(client: httpx.AsyncClient, url: str) -> dict:
-    """Send a single request and return response info."""
+async def _send_request(client: httpx.AsyncClient, url: httpx.URL, capture_headers: bool = False) -> dict:
+    """Send a single request and return response info (headers only if capture_headers)."""
     try:
-        response = await client.get(url)
-        return {
+        response = await client.get(url, timeout=_FLOOD_TIMEOUT)
+        result = {
             "status_code": response.status_code,
             "success": response.status_code == 200,
             "rate_limited": response.status_code == 429,
-            "headers": dict(response.headers),
         }
+        if capture_headers:
+            result["headers"] = dict(response.headers)
+        return result
     except Exception as e:
         return {
             "status_code": 0,
@@ -85,50 +118,65 @@ async def _send_request(client: httpx.AsyncClient, url: str) -> dict:
 
 
 async def _flood_requests(
+    client: httpx.AsyncClient,
     target_base_url: str,
     endpoint: str,
     total_requests: int,
     requests_per_second: float
 ) -> dict:
-    """Send requests at specified rate and track responses."""
-    url = f"{target_base_url.rstrip('/')}{endpoint}"
-    results = {
-        "total_sent": 0,
-        "successful": 0,
-        "rate_limited": 0,
-        "errors": 0,
-        "responses": [],
-    }
+    """
+    Send requests at specified rate and track responses.
     
-    delay_between_requests = 1.0 / requests_per_second if requests_per_second > 0 else 0
+    Request i is launched at i / requests_per_second from the start and
+    requests run concurrently, so the achieved rate is bounded by
+    requests_per_second rather than by the target's round-trip time.
+    """
+    url = _target_url(target_base_url, endpoint)
+    delay_between_requests = 1.0 / requests_per_second
     
-    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-        for i in range(total_requests):
-            result = await _send_request(client, url)
-            results["total_sent"] += 1
-            
-            if result.get("success"):
-                results["successful"] += 1
-            elif result.get("rate_limited"):
-                results["rate_limited"] += 1
-            else:
-                results["errors"] += 1
-            
-            # Store first few and last few responses for debugging
-            if i < 5 or i >= total_requests - 5:
-                results["responses"].append({
-                    "request": i + 1,
-                    **result
-                })
-            
-            # Rate limiting: wait before next request
-            if i < total_requests - 1:  # Don't wait after last request
-                await asyncio.sleep(delay_between_requests)
+    # Bound in-flight requests so a slow target can't pile up unbounded sockets
+    sem = asyncio.Semaphore(max(8, int(requests_per_second)))
+    
+    def sampled(i: int) -> bool:
+        # Only the first few and last few responses are kept for debugging
+        return i < 5 or i >= total_requests - 5
+    
+    async def one(i: int) -> dict:
+        async with sem:
+            return await _send_request(client, url, capture_headers=sampled(i))
+    
+    # Launch each request at its deadline from a single scheduler, so only
+    # in-flight requests exist at a time and sleeps don't accumulate drift
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+    for i in range(total_requests):
+        wait = start + i * delay_between_requests - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        tasks.append(asyncio.create_task(one(i)))
+    outcomes = await asyncio.gather(*tasks)
+    
+    # Aggregate in a single pass once everything has finished
+    successful = sum(1 for r in outcomes if r["success"])
+    rate_limited = sum(1 for r in outcomes if r["rate_limited"])
+    results = {
+        "total_sent": len(outcomes),
+        "successful": successful,
+        "rate_limited": rate_limited,
+        "errors": len(outcomes) - successful - rate_limited,
+        "responses": [
+            {"request": i + 1, **outcomes[i]}
+            for i in range(total_requests)
+            if sampled(i)
+        ],
+    }
     
     return results
 
 
 async def _run_attack(
+    client: httpx.AsyncClient,
     attack_id: str,
     target_base_url: str,
     max_requests: int,
@@ -140,21 +188,22 @@ async def _run_attack(
 ) -> None:
     """Run the rate limit attack."""
     _attacks[attack_id]["state"] = "running"
-    _attacks[attack_id]["started_at"] = time.time()
+    _clock.mark(_attacks[attack_id], "started_at")
     
     try:
         # Step 1: Get and backup current config
-        original_config = await _get_current_config(target_base_url)
+        original_config = await _get_current_config(client, target_base_url)
         _attacks[attack_id]["original_config"] = original_config
         
         if not original_config:
             _attacks[attack_id]["state"] = "failed"
             _attacks[attack_id]["error"] = "Failed to get current rate limit configuration"
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
             return
         
         # Step 2: Set restrictive limits
         new_config = await _update_config(
+            client,
             target_base_url,
             enabled=True,
             max_requests=max_requests,
@@ -166,7 +215,7 @@ async def _run_attack(
         if new_config.get("max_requests") != max_requests:
             _attacks[attack_id]["state"] = "failed"
             _attacks[attack_id]["error"] = f"Failed to set restrictive limits. Expected {max_requests}, got {new_config.get('max_requests')}"
-            _attacks[attack_id]["finished_at"] = time.time()
+            _clock.mark(_attacks[attack_id], "finished_at")
             return
         
         _attacks[attack_id]["config_updated"] = True
@@ -175,6 +224,7 @@ async def _run_attack(
         await asyncio.sleep(1)  # Brief pause after config update
         
         flood_results = await _flood_requests(
+            client,
             target_base_url,
             target_endpoint,
             flood_requests,
@@ -183,7 +233,7 @@ async def _run_attack(
         _attacks[attack_id]["flood_results"] = flood_results
         
         # Step 4: Get stats from target server
-        stats = await _get_stats(target_base_url)
+        stats = await _get_stats(client, target_base_url)
         _attacks[attack_id]["target_stats"] = stats
         
         # Step 5: Verify 429s were generated
@@ -202,6 +252,7 @@ async def _run_attack(
             
             # Restore original config
             restored_config = await _update_config(
+                client,
                 target_base_url,
                 enabled=original_config.get("enabled", True),
                 max_requests=original_config.get("max_requests", 100),
@@ -212,6 +263,7 @@ async def _run_attack(
             # Verify recovery
             await asyncio.sleep(1)
             recovery_test = await _flood_requests(
+                client,
                 target_base_url,
                 target_endpoint,
                 max_requests + 5,  # Send a few more than the restored limit
@@ -229,12 +281,12 @@ async def _run_attack(
         else:
             _attacks[attack_id]["state"] = "completed"  # Manual recovery required
         
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
         
     except Exception as e:
         _attacks[attack_id]["state"] = "failed"
         _attacks[attack_id]["error"] = str(e)
-        _attacks[attack_id]["finished_at"] = time.time()
+        _clock.mark(_attacks[attack_id], "finished_at")
 
 
 @router.post("/break/rate_limit")
@@ -277,6 +329,7 @@ async def break_rate_limit(
         le=3600,
         description="Auto-recovery: restore original limits after N seconds (None = manual recovery)"
     ),
+    http: httpx.AsyncClient = Depends(get_http),
 ):
     """
     Break rate limits by setting restrictive limits and flooding with requests.
@@ -290,6 +343,10 @@ async def break_rate_limit(
     
     This simulates misconfigured rate limits causing legitimate traffic to be blocked.
     """
+    bulkhead = get_bulkhead(_bulkheads, _target_key(target_base_url))
+    if not bulkhead.try_reserve():
+        raise HTTPException(status_code=429, detail="Too many rate limit attacks running or queued against this target")
+    
     attack_id = str(uuid.uuid4())
     
     _attacks[attack_id] = {
@@ -305,7 +362,8 @@ async def break_rate_limit(
         "created_at": time.time(),
     }
     
-    asyncio.create_task(_run_attack(
+    asyncio.create_task(bulkhead.run(_run_attack(
+        http,
         attack_id,
         target_base_url,
         max_requests,
@@ -314,7 +372,7 @@ async def break_rate_limit(
         flood_rate,
         target_endpoint,
         duration_seconds,
-    ))
+    )))
     
     return {"status": "started", "attack_id": attack_id}
 
@@ -326,23 +384,12 @@ async def break_rate_limit_status(attack_id: str):
     if not attack:
         raise HTTPException(status_code=404, detail="Unknown attack_id")
     
-    # Calculate duration if attack is running
-    duration = None
-    if attack.get("started_at") and not attack.get("finished_at"):
-        duration = time.time() - attack["started_at"]
-    elif attack.get("started_at") and attack.get("finished_at"):
-        duration = attack["finished_at"] - attack["started_at"]
-    
-    response = {
-        k: v for k, v in attack.items()
-        if k not in []  # No sensitive data to exclude
-    }
-    response["duration_seconds"] = duration
-    return response
+    # Elapsed so far if running, total once finished (monotonic, see AttackClock)
+    return {**attack, "duration_seconds": _clock.elapsed(attack_id)}
 
 
 @router.post("/break/rate_limit/{attack_id}/stop")
-async def break_rate_limit_stop(attack_id: str):
+async def break_rate_limit_stop(attack_id: str, http: httpx.AsyncClient = Depends(get_http)):
     """Stop the attack and restore original rate limit configuration."""
     attack = _attacks.get(attack_id)
     if not attack:
@@ -361,7 +408,7 @@ async def break_rate_limit_stop(attack_id: str):
     if not original_config:
         attack["state"] = "recovery_failed"
         attack["error"] = "No original config to restore"
-        attack["finished_at"] = time.time()
+        _clock.mark(attack, "finished_at")
         return {
             "status": "recovery_failed",
             "attack_id": attack_id,
@@ -371,6 +418,7 @@ async def break_rate_limit_stop(attack_id: str):
     try:
         # Restore original config
         restored_config = await _update_config(
+            http,
             target_base_url,
             enabled=original_config.get("enabled", True),
             max_requests=original_config.get("max_requests", 100),
@@ -378,7 +426,7 @@ async def break_rate_limit_stop(attack_id: str):
         )
         attack["manual_restored_config"] = restored_config
         attack["state"] = "recovered"
-        attack["finished_at"] = time.time()
+        _clock.mark(attack, "finished_at")
         
         return {
             "status": "recovered",
@@ -388,7 +436,7 @@ async def break_rate_limit_stop(attack_id: str):
     except Exception as e:
         attack["state"] = "recovery_failed"
         attack["error"] = str(e)
-        attack["finished_at"] = time.time()
+        _clock.mark(attack, "finished_at")
         return {
             "status": "recovery_failed",
             "attack_id": attack_id,
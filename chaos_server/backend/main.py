@@ -2,23 +2,38 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.core.config import settings
+from app.core.http import create_http_client
 from app.routes.health import router as health_router
 from app.routes.break_db_pool import router as break_db_pool_router
-from app.routes.break_migrations import router as break_migrations_router
+from app.routes.break_migrations import router as break_migrations_router, cancel_active_attacks as cancel_migration_attacks, close_pools as close_migration_pools
 from app.routes.break_long_transactions import router as break_long_transactions_router
-from app.routes.break_env_vars import router as break_env_vars_router
+from app.routes.break_env_vars import router as break_env_vars_router, rollback_active_attacks as rollback_env_var_attacks
 from app.routes.break_api_crash import router as break_api_crash_router
 from app.routes.break_rate_limit import router as break_rate_limit_router
 
 
+# (router, OpenAPI tag), mounted under settings.api_v1_prefix in this order
+ROUTERS = (
+    (health_router, "health"),
+    (break_db_pool_router, "break"),
+    (break_migrations_router, "break"),
+    (break_long_transactions_router, "break"),
+    (break_env_vars_router, "break"),
+    (break_api_crash_router, "break"),
+    (break_rate_limit_router, "break"),
+)
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.app_name,
         description="Backend API for the Chaos Server component",
         version=settings.version,
         debug=settings.debug,
+        default_response_class=ORJSONResponse,
     )
 
     # CORS (configure properly for production)
@@ -31,13 +46,22 @@ def create_app() -> FastAPI:
     )
 
     # Routers
-    app.include_router(health_router, prefix=settings.api_v1_prefix, tags=["health"])
-    app.include_router(break_db_pool_router, prefix=settings.api_v1_prefix, tags=["break"])
-    app.include_router(break_migrations_router, prefix=settings.api_v1_prefix, tags=["break"])
-    app.include_router(break_long_transactions_router, prefix=settings.api_v1_prefix, tags=["break"])
-    app.include_router(break_env_vars_router, prefix=settings.api_v1_prefix, tags=["break"])
-    app.include_router(break_api_crash_router, prefix=settings.api_v1_prefix, tags=["break"])
-    app.include_router(break_rate_limit_router, prefix=settings.api_v1_prefix, tags=["break"])
+    for router, tag in ROUTERS:
+        app.include_router(router, prefix=settings.api_v1_prefix, tags=[tag])
+
+    @app.on_event("startup")
+    async def startup_event():
+        # One keep-alive HTTP client shared by all attacks
+        app.state.http = create_http_client()
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        # Don't leave the target's .env broken across redeploys
+        await rollback_env_var_attacks()
+        # Roll back migration attacks while their pools are still open
+        await cancel_migration_attacks()
+        await close_migration_pools()
+        await app.state.http.aclose()
 
     @app.get("/")
     async def root():
@@ -54,12 +78,24 @@ app = create_app()
 
 
 if __name__ == "__main__":
+    import asyncio
+    import sys
+
     import uvicorn
 
+    if sys.platform == "win32":
+        # psycopg's async connections (migration attacks) can't run on the
+        # default Proactor loop, which uvicorn keeps for single-process runs
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
+        # uvloop has no Windows support; both come with uvicorn[standard]
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=1 if settings.debug else settings.workers,
         log_level="info",
     )
@@ -4,27 +4,24 @@ Script to upgrade database to latest migration.
 Run this before creating new migrations.
 """
 
-import subprocess
-import sys
+from alembic import command
+from alembic.config import Config
+from alembic.util import CommandError
 
 def upgrade_database():
     """Upgrade database to latest migration"""
+    # Run Alembic in-process rather than spawning `python -m alembic`; its own
+    # log output (configured by alembic.ini) goes straight to the console.
+    # Prints, not logging: env.py's fileConfig() disables loggers created before it.
     try:
         print("Upgrading database to latest migration...")
-        result = subprocess.run([
-            sys.executable, "-m", "alembic", "upgrade", "head"
-        ], capture_output=True, text=True, cwd=".")
-
-        if result.returncode == 0:
-            print("✅ Database upgrade successful!")
-            print(result.stdout)
-        else:
-            print("❌ Database upgrade failed!")
-            print("STDOUT:", result.stdout)
-            print("STDERR:", result.stderr)
+        command.upgrade(Config("alembic.ini"), "head")
+        print("✅ Database upgrade successful!")
 
+    except CommandError as e:
+        print(f"❌ Database upgrade failed: {e}")
     except Exception as e:
         print(f"❌ Error upgrading database: {e}")
 
 if __name__ == "__main__":
-    upgrade_database()
\ No newline at end of file
+    upgrade_database()
@@ -1,15 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 import logging
+import threading
+import time
 
 # Create Base class for models
 Base = declarative_base()
 
-# Global variables for lazy initialization
+# Global variables for lazy initialization. Both are created at startup
+# (see main.py); the lock only guards against two threads racing to create
+# them if something touches the database before that.
 _engine = None
 _SessionLocal = None
+_init_lock = threading.Lock()
 
 logger = logging.getLogger(__name__)
 
@@ -17,21 +23,37 @@ def get_engine():
     """Get database engine with lazy initialization"""
     global _engine
     if _engine is None:
-        _engine = create_engine(
-            settings.database_url,
-            pool_pre_ping=True,
-            pool_size=settings.db_pool_size,
-            max_overflow=settings.db_max_overflow,
-            pool_timeout=settings.db_pool_timeout,
-            echo=settings.debug
-        )
+        with _init_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    settings.database_url,
+                    pool_pre_ping=settings.db_pool_pre_ping,
+                    pool_size=settings.db_pool_size,
+                    max_overflow=settings.db_max_overflow,
+                    pool_timeout=settings.db_pool_timeout,
+                    pool_recycle=settings.db_pool_recycle,
+                    # Reuse the most recently returned connection so idle
+                    # ones can age out under bursty load
+                    pool_use_lifo=True,
+                    # libpq TCP keepalives so dead peers are noticed without pinging
+                    connect_args={
+                        "keepalives": 1,
+                        "keepalives_idle": 30,
+                        "keepalives_interval": 10,
+                        "keepalives_count": 3,
+                    },
+                    echo=settings.debug
+                )
     return _engine
 
 def get_session_local():
     """Get SessionLocal class with lazy initialization"""
     global _SessionLocal
     if _SessionLocal is None:
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+        engine = get_engine()
+        with _init_lock:
+            if _SessionLocal is None:
+                _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return _SessionLocal
 
 def get_db():
@@ -54,6 +76,31 @@ def create_tables():
         logger.warning("Database tables will be created when the database is available.")
 
 
+def warm_pool():
+    """
+    Open pool_size connections in parallel and return them to the pool, so the
+    first requests after startup don't each pay for a new connection.
+    They're all held at once; opening them one by one would just reuse the first.
+    """
+    size = settings.db_pool_size
+    if size <= 0:
+        # pool_size=0 is a legal unbounded QueuePool; nothing to pre-open
+        return
+    engine = get_engine()
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        futures = [executor.submit(engine.connect) for _ in range(size)]
+    opened = 0
+    for future in futures:
+        try:
+            future.result().close()
+            opened += 1
+        except Exception as e:
+            last_error = e
+    if opened < size:
+        # Best effort, like create_tables(): the pool fills on demand anyway
+        logger.warning("Warmed %d/%d pool connections: %s", opened, size, last_error)
+
+
 def _calculate_pool_health(utilization: float) -> tuple[str, str]:
     """Calculate pool health and utilization status based on percentage."""
     if utilization >= 90:
@@ -66,11 +113,30 @@ def _calculate_pool_health(utilization: float) -> tuple[str, str]:
         return "healthy", "low"
 
 
+# (monotonic time, metrics) of the last pool snapshot; replaced as one tuple so
+# threadpool and event-loop readers never see a half-updated cache
+_pool_metrics_cache: tuple[float, dict] = (float("-inf"), {})
+_POOL_METRICS_TTL = 1.0
+
+
 def get_pool_metrics() -> dict:
     """
     Best-effort pool metrics for observability/debugging.
     Returns sanitized metrics that indicate health without revealing exact state.
+    Memoized for a second: scrapes don't need fresher data, and checkedout()
+    takes the pool's queue mutex that request threads check connections in/out through.
     """
+    global _pool_metrics_cache
+    now = time.monotonic()
+    cached_at, metrics = _pool_metrics_cache
+    if now - cached_at < _POOL_METRICS_TTL:
+        return metrics
+    metrics = _sample_pool_metrics()
+    _pool_metrics_cache = (now, metrics)
+    return metrics
+
+
+def _sample_pool_metrics() -> dict:
     engine = get_engine()
     pool = getattr(engine, "pool", None)
     if pool is None:
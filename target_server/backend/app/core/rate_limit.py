@@ -2,24 +2,42 @@
 Rate limiting module for target server.
 Provides configurable rate limiting with in-memory storage.
 """
+import asyncio
+import dataclasses
 import time
-from collections import defaultdict, deque
+from collections import deque
 from typing import Dict, Tuple
 from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+from starlette.middleware.base import BaseHTTPMiddleware
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
-# Global rate limit configuration (can be updated dynamically)
-_rate_limit_config = {
-    "enabled": True,
-    "max_requests": 100,
-    "window_seconds": 60,
-}
+@dataclasses.dataclass(slots=True, frozen=True)
+class RateLimitConfig:
+    enabled: bool = True
+    max_requests: int = 100
+    window_seconds: int = 60
+
+
+# Global rate limit configuration (can be updated dynamically). Updates swap in
+# a new frozen instance, so readers that bind it once see a consistent config.
+_rate_limit_config = RateLimitConfig()
+
+# In-memory storage: IP -> deque of request timestamps (time.monotonic(), so
+# the window can't be corrupted by wall-clock jumps). IPs with no requests
+# left in the window are swept out in the background (see sweep_idle_ips) so
+# the dict doesn't grow with every client ever seen.
+_rate_limit_storage: Dict[str, deque] = {}
 
-# In-memory storage: IP -> deque of request timestamps
-_rate_limit_storage: Dict[str, deque] = defaultdict(lambda: deque())
+# Sweep this many IPs, then yield to the event loop
+_SWEEP_BATCH_SIZE = 1000
+
+# Adds to a monotonic timestamp to get epoch seconds, for X-RateLimit-Reset.
+# Captured once so each request reads the clock only once.
+_EPOCH_OFFSET = time.time() - time.monotonic()
 
 # Statistics
 _rate_limit_stats = {
@@ -31,39 +49,73 @@ _rate_limit_stats = {
 
 def get_rate_limit_config() -> dict:
     """Get current rate limit configuration."""
-    return _rate_limit_config.copy()
+    return dataclasses.asdict(_rate_limit_config)
 
 
 def update_rate_limit_config(enabled: bool = None, max_requests: int = None, window_seconds: int = None):
     """Update rate limit configuration dynamically."""
-    if enabled is not None:
-        _rate_limit_config["enabled"] = enabled
-    if max_requests is not None:
-        _rate_limit_config["max_requests"] = max_requests
-    if window_seconds is not None:
-        _rate_limit_config["window_seconds"] = window_seconds
+    global _rate_limit_config
+    changes = {"enabled": enabled, "max_requests": max_requests, "window_seconds": window_seconds}
+    _rate_limit_config = dataclasses.replace(
+        _rate_limit_config, **{k: v for k, v in changes.items() if v is not None}
+    )
+    _build_429_template()
     logger.info(f"Rate limit config updated: {_rate_limit_config}")
 
 
+# Pre-encoded parts of the 429 response; only the retry/reset numbers vary per
+# request, so the rest is rebuilt on config change instead of per rejection
+_429_body_prefix = b""
+_limit_header = b""
+
+
+def _build_429_template():
+    global _429_body_prefix, _limit_header
+    max_requests = _rate_limit_config.max_requests
+    body = orjson.dumps({
+        "error": "Rate limit exceeded",
+        "message": f"Too many requests. Limit: {max_requests} per {_rate_limit_config.window_seconds} seconds",
+    })
+    # Reopen the object to append the per-request retry_after
+    _429_body_prefix = body[:-1] + b',"retry_after":'
+    _limit_header = str(max_requests).encode()
+
+
+_build_429_template()
+
+
 def get_rate_limit_stats() -> dict:
     """Get rate limiting statistics."""
     return {
-        "config": _rate_limit_config.copy(),
+        "config": dataclasses.asdict(_rate_limit_config),
         "stats": _rate_limit_stats.copy(),
     }
 
 
+# Raw ASGI header names are lowercase bytes
+_X_FORWARDED_FOR = b"x-forwarded-for"
+_X_REAL_IP = b"x-real-ip"
+
+
 def _get_client_ip(request: Request) -> str:
     """Extract client IP address from request."""
+    # Single pass over the raw headers; this runs on every request, so skip
+    # building Starlette's case-insensitive Headers object. Like headers.get(),
+    # the first occurrence of each header wins.
+    forwarded_for = real_ip = None
+    for name, value in request.scope["headers"]:
+        if name == _X_FORWARDED_FOR and forwarded_for is None:
+            forwarded_for = value
+        elif name == _X_REAL_IP and real_ip is None:
+            real_ip = value
+    
     # Check for forwarded IP (from proxy/load balancer)
-    forwarded_for = request.headers.get("X-Forwarded-For")
     if forwarded_for:
-        return forwarded_for.split(",")[0].strip()
+        return forwarded_for.partition(b",")[0].strip().decode("latin-1")
     
     # Check for real IP header
-    real_ip = request.headers.get("X-Real-IP")
     if real_ip:
-        return real_ip
+        return real_ip.decode("latin-1")
     
     # Fallback to direct client
     if request.client:
@@ -72,36 +124,53 @@ def _get_client_ip(request: Request) -> str:
     return "unknown"
 
 
-def _clean_old_requests(ip: str, window_seconds: int):
+def _clean_old_requests(request_times: deque, cutoff_time: float):
     """Remove request timestamps outside the time window."""
-    current_time = time.time()
-    cutoff_time = current_time - window_seconds
-    
-    request_times = _rate_limit_storage[ip]
-    # Remove timestamps older than the window
     while request_times and request_times[0] < cutoff_time:
         request_times.popleft()
 
 
+async def sweep_idle_ips():
+    """
+    Background task: once per window, drop IPs whose most recent request is
+    outside the window. Works through the keys in batches so a large table
+    doesn't stall request handling.
+    """
+    while True:
+        window_seconds = _rate_limit_config.window_seconds
+        await asyncio.sleep(window_seconds)
+        cutoff_time = time.monotonic() - window_seconds
+        ips = list(_rate_limit_storage)
+        for start in range(0, len(ips), _SWEEP_BATCH_SIZE):
+            for ip in ips[start:start + _SWEEP_BATCH_SIZE]:
+                request_times = _rate_limit_storage.get(ip)
+                if request_times is not None and (not request_times or request_times[-1] < cutoff_time):
+                    del _rate_limit_storage[ip]
+            await asyncio.sleep(0)
+
+
 async def check_rate_limit(request: Request) -> Tuple[bool, dict]:
     """
     Check if request should be rate limited.
     Returns: (is_allowed, rate_limit_info)
     """
-    if not _rate_limit_config["enabled"]:
+    config = _rate_limit_config
+    if not config.enabled:
         return True, {}
     
     ip = _get_client_ip(request)
-    max_requests = _rate_limit_config["max_requests"]
-    window_seconds = _rate_limit_config["window_seconds"]
-    
-    current_time = time.time()
+    max_requests = config.max_requests
+    window_seconds = config.window_seconds
     
-    # Clean old requests outside the window
-    _clean_old_requests(ip, window_seconds)
+    current_time = time.monotonic()
+    cutoff_time = current_time - window_seconds
     
-    # Get current request count for this IP
-    request_times = _rate_limit_storage[ip]
+    # Get this IP's requests, cleaning old ones outside the window
+    request_times = _rate_limit_storage.get(ip)
+    if request_times is None:
+        request_times = _rate_limit_storage[ip] = deque()
+    else:
+        _clean_old_requests(request_times, cutoff_time)
     current_count = len(request_times)
     
     # Update statistics
@@ -118,9 +187,10 @@ async def check_rate_limit(request: Request) -> Tuple[bool, dict]:
             f"Window: {window_seconds}s"
         )
         
-        # Calculate reset time (oldest request + window)
-        reset_time = int(request_times[0] + window_seconds) if request_times else int(current_time + window_seconds)
-        retry_after = max(0, reset_time - int(current_time))
+        # Calculate reset time (oldest request + window), as epoch seconds
+        oldest = request_times[0] if request_times else current_time
+        reset_time = int(oldest + window_seconds + _EPOCH_OFFSET)
+        retry_after = max(0, reset_time - int(current_time + _EPOCH_OFFSET))
         
         return False, {
             "limit": max_requests,
@@ -134,7 +204,7 @@ async def check_rate_limit(request: Request) -> Tuple[bool, dict]:
     
     # Calculate remaining requests
     remaining = max(0, max_requests - (current_count + 1))
-    reset_time = int(current_time + window_seconds)
+    reset_time = int(current_time + window_seconds + _EPOCH_OFFSET)
     
     return True, {
         "limit": max_requests,
@@ -144,10 +214,15 @@ async def check_rate_limit(request: Request) -> Tuple[bool, dict]:
     }
 
 
+# Probe and scrape endpoints, never rate limited so monitoring keeps working
+# while the limiter is being flooded. Matched against the raw scope path.
+_SKIP_PATHS: frozenset[str] = frozenset({"/", "/healthz", "/api/v1/ready", "/api/v1/metrics"})
+
+
 async def rate_limit_middleware(request: Request, call_next):
     """FastAPI middleware for rate limiting."""
     # Skip rate limiting for health checks
-    if request.url.path in ["/healthz", "/"]:
+    if request.scope["path"] in _SKIP_PATHS:
         return await call_next(request)
     
     # Check rate limit
@@ -155,28 +230,49 @@ async def rate_limit_middleware(request: Request, call_next):
     
     if not is_allowed:
         # Return 429 Too Many Requests
-        response = JSONResponse(
+        retry_after = str(rate_limit_info["retry_after"]).encode()
+        response = Response(
+            content=_429_body_prefix + retry_after + b"}",
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            content={
-                "error": "Rate limit exceeded",
-                "message": f"Too many requests. Limit: {rate_limit_info['limit']} per {_rate_limit_config['window_seconds']} seconds",
-                "retry_after": rate_limit_info["retry_after"],
-            }
+            media_type="application/json",
         )
-        # Add rate limit headers
-        response.headers["X-RateLimit-Limit"] = str(rate_limit_info["limit"])
-        response.headers["X-RateLimit-Remaining"] = str(rate_limit_info["remaining"])
-        response.headers["X-RateLimit-Reset"] = str(rate_limit_info["reset"])
-        response.headers["Retry-After"] = str(rate_limit_info["retry_after"])
+        # Add rate limit headers (appended raw; none of them are set yet)
+        response.raw_headers += [
+            (b"x-ratelimit-limit", _limit_header),
+            (b"x-ratelimit-remaining", b"0"),
+            (b"x-ratelimit-reset", str(rate_limit_info["reset"]).encode()),
+            (b"retry-after", retry_after),
+        ]
         return response
     
     # Proceed with request
     response = await call_next(request)
     
-    # Add rate limit headers to successful responses
-    response.headers["X-RateLimit-Limit"] = str(rate_limit_info["limit"])
-    response.headers["X-RateLimit-Remaining"] = str(rate_limit_info["remaining"])
-    response.headers["X-RateLimit-Reset"] = str(rate_limit_info["reset"])
+    # Add rate limit headers to successful responses (none when limiting is disabled)
+    if rate_limit_info:
+        response.raw_headers += [
+            (b"x-ratelimit-limit", _limit_header),
+            (b"x-ratelimit-remaining", str(rate_limit_info["remaining"]).encode()),
+            (b"x-ratelimit-reset", str(rate_limit_info["reset"]).encode()),
+        ]
     
     return response
 
+
+class RateLimitMiddleware:
+    """
+    ASGI wrapper around rate_limit_middleware. While limiting is disabled,
+    requests go straight to the app, skipping the BaseHTTPMiddleware
+    request/response plumbing altogether. The check reads the live config, so
+    enabling it at runtime (e.g. via /rate_limit/config) takes effect immediately.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._limited = BaseHTTPMiddleware(app, dispatch=rate_limit_middleware)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _rate_limit_config.enabled:
+            await self.app(scope, receive, send)
+            return
+        await self._limited(scope, receive, send)
@@ -1,14 +1,20 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as SATimeoutError
+from ..core.config import settings
 from ..core.database import get_db, get_pool_metrics, get_engine
-import psutil
+import asyncio
+import re
+import threading
 import time
 from pathlib import Path
 from collections import deque
+from functools import lru_cache
 from datetime import datetime, timezone
 from alembic import command
 from alembic.config import Config
+from alembic.script import ScriptDirectory
 import os
 
 router = APIRouter()
@@ -16,45 +22,150 @@ router = APIRouter()
 # In-memory metrics tracking (for demo purposes)
 # In production, this would be in Redis/Prometheus/etc.
 _request_times = deque(maxlen=100)
+_request_time_sum = 0.0  # running sum of _request_times, so /metrics doesn't re-sum the window
+# (sum, count) of the window, rebound as one tuple: /metrics reads it from a
+# threadpool worker while the event loop records requests
+_request_time_stats = (0.0, 0)
 _error_count = 0
 _success_count = 0
 
+
+def record_request_time(duration_ms: float):
+    """Add a response time sample, keeping _request_time_sum in step with the window."""
+    global _request_time_sum, _request_time_stats
+    if len(_request_times) == _request_times.maxlen:
+        _request_time_sum -= _request_times[0]  # about to be evicted by append()
+    _request_times.append(duration_ms)
+    _request_time_sum += duration_ms
+    _request_time_stats = (_request_time_sum, len(_request_times))
+
+# System metrics shared by /health and /metrics, refreshed in the background
+# (see refresh_system_metrics) so probes never wait on a CPU sample
+SYSTEM_METRICS_INTERVAL_SECONDS = 5
+# Readers resample themselves once a snapshot is older than this (refresher not
+# started yet, or died); the lock keeps concurrent threadpool readers from all doing it
+SYSTEM_METRICS_MAX_AGE_SECONDS = 2 * SYSTEM_METRICS_INTERVAL_SECONDS
+FIRST_CPU_SAMPLE_SECONDS = 0.1
+_system_metrics: dict = {}
+_system_metrics_at = float("-inf")  # time.monotonic() of the snapshot above
+_system_metrics_lock = threading.Lock()
+# psutil.pids() lists all of /proc, so the process count is refreshed less often
+PROCESS_COUNT_INTERVAL_SECONDS = 30
+_process_count = (float("-inf"), 0)  # (time.monotonic(), count)
+_psutil = None
+# Disk to report usage for; cross-platform root (Windows needs a drive like "C:\\")
+_DISK_ROOT = Path.cwd().anchor or "/"
+
+
+def _get_psutil():
+    """Import psutil on first use rather than when the routes are imported."""
+    global _psutil
+    if _psutil is None:
+        import psutil
+        _psutil = psutil
+    return _psutil
+
+
+def _sample_system_metrics() -> None:
+    """Take a new system metrics sample. CPU is the average since the previous sample."""
+    global _system_metrics, _system_metrics_at, _process_count
+    psutil = _get_psutil()
+    now = time.monotonic()
+    if now - _process_count[0] >= PROCESS_COUNT_INTERVAL_SECONDS:
+        _process_count = (now, len(psutil.pids()))
+    # The first non-blocking cpu_percent() has no previous reading to compare
+    # against, so the first sample blocks briefly to get a real figure; that
+    # call also sets the baseline for the non-blocking ones after it
+    cpu_interval = None if _system_metrics_at > float("-inf") else FIRST_CPU_SAMPLE_SECONDS
+    # Swap in a new dict rather than updating in place, so a reader never sees
+    # a mix of two samples
+    _system_metrics = {
+        "cpu_percent": psutil.cpu_percent(interval=cpu_interval),
+        "memory_percent": psutil.virtual_memory().percent,
+        "disk_percent": psutil.disk_usage(_DISK_ROOT).percent,
+        "process_count": _process_count[1],
+    }
+    _system_metrics_at = now
+
+
+async def refresh_system_metrics() -> None:
+    """Background task: resample system metrics every few seconds."""
+    while True:
+        # In a thread: pids()/disk_usage() do filesystem I/O that shouldn't stall the loop
+        await asyncio.to_thread(_sample_system_metrics)
+        await asyncio.sleep(SYSTEM_METRICS_INTERVAL_SECONDS)
+
+
+def _get_system_metrics() -> dict:
+    if time.monotonic() - _system_metrics_at > SYSTEM_METRICS_MAX_AGE_SECONDS:
+        with _system_metrics_lock:
+            if time.monotonic() - _system_metrics_at > SYSTEM_METRICS_MAX_AGE_SECONDS:
+                _sample_system_metrics()
+    return _system_metrics
+
+# Keyword groups used to sanitize DB errors. One alternation pass finds every
+# group present in a message; each handler then checks the groups it cares about
+# in its own priority order, wherever in the message they appear.
+_DB_ERROR_RE = re.compile(
+    r"(?P<timeout>timeout|pool)|(?P<auth>auth|password)|(?P<refused>refused|connect)|(?P<blocked>lock|waiting|blocked)",
+    re.IGNORECASE,
+)
+
+
+def _db_error_kinds(e: Exception) -> set[str]:
+    if isinstance(e, SATimeoutError):
+        # Pool checkout timeout: by far the most frequent error while the pool is
+        # exhausted, and its type alone classifies it (the text says "QueuePool ... timeout")
+        return {"timeout"}
+    return {m.lastgroup for m in _DB_ERROR_RE.finditer(str(e))}
+
+
+# Sanitized /health DB error messages, in priority order
+_HEALTH_DB_ERRORS = {
+    "timeout": "Database connection timeout",
+    "auth": "Database authentication failed",
+    "refused": "Database connection refused",
+}
+
+# Sent as-is through exec_driver_sql: no SQLAlchemy compile or cache lookup
+_PING = "SELECT 1"
+
+
+def _classify_db_error(e: Exception) -> str:
+    kinds = _db_error_kinds(e)
+    return next((message for kind, message in _HEALTH_DB_ERRORS.items() if kind in kinds), "Database error")
+
+
 @router.get("/health")
-async def health_check():
+def health_check():
     """
     Comprehensive health check endpoint
     Returns health status with sanitized errors.
     Provides symptoms rather than root causes to enable proper diagnosis.
+
+    Like the other DB-touching endpoints here this is a plain def, so FastAPI
+    runs it in its threadpool: the sync SQLAlchemy calls block a worker thread
+    instead of the event loop. It keeps using the same sync pool as /pool/hold
+    so pool exhaustion shows up here.
     """
     # Test database connection
     try:
-        from ..core.database import get_session_local
-        session_local_cls = get_session_local()
-        db = session_local_cls()
-        db.execute(text("SELECT 1"))
-        db.close()
+        # A bare pooled connection is enough for a ping; no Session needed
+        with get_engine().connect() as conn:
+            conn.exec_driver_sql(_PING)
         db_status = "healthy"
         db_error = None
     except Exception as e:
         db_status = "unhealthy"
         # Sanitize error message - don't expose exact root cause
-        error_str = str(e).lower()
-        if "timeout" in error_str or "pool" in error_str:
-            db_error = "Database connection timeout"
-        elif "auth" in error_str or "password" in error_str:
-            db_error = "Database authentication failed"
-        elif "refused" in error_str or "connect" in error_str:
-            db_error = "Database connection refused"
-        else:
-            db_error = "Database error"
+        db_error = _classify_db_error(e)
 
-    # Get system metrics
-    # Cross-platform disk root (Windows needs a drive like "C:\\")
-    disk_root = Path.cwd().anchor or "/"
+    # Get system metrics (cached)
+    cached = _get_system_metrics()
     system_metrics = {
-        "cpu_percent": psutil.cpu_percent(interval=1),
-        "memory_percent": psutil.virtual_memory().percent,
-        "disk_percent": psutil.disk_usage(disk_root).percent
+        "cpu_percent": cached["cpu_percent"],
+        "memory_percent": cached["memory_percent"],
+        "disk_percent": cached["disk_percent"],
     }
 
     # Determine overall health
@@ -83,56 +194,75 @@ async def readiness_check():
     return {"status": "ready"}
 
 
-def _ensure_items_table(db, engine):
-    """Ensure items table exists, create if it doesn't."""
-    from ..core.database import Base
+def _with_items_table(db, query):
+    """
+    Run query(db), creating the items table and retrying once if it's missing.
+    Cheaper than probing for the table before every query.
+    """
     try:
-        db.execute(text("SELECT COUNT(*) FROM items"))
+        return query(db)
     except Exception as table_error:
-        if "does not exist" in str(table_error).lower() or "undefinedtable" in str(table_error).lower():
-            Base.metadata.create_all(bind=engine)
+        if "does not exist" not in str(table_error).lower() and "undefinedtable" not in str(table_error).lower():
+            raise
+        # The failed statement aborted the session's transaction
+        db.rollback()
+        # Imported here, not at module level: registering Item on Base.metadata
+        # before startup would make create_tables() create this Alembic-managed
+        # table on every boot
+        from ..core.models import Item
+        Item.__table__.create(bind=get_engine(), checkfirst=True)
+        return query(db)
+
+
+# Count plus first 10 rows in one round trip; the LATERAL join still yields
+# a row carrying the count when the table is empty
+_ITEMS_QUERY = text(
+    "SELECT c.count, i.id, i.name FROM (SELECT COUNT(*) FROM items) c "
+    "LEFT JOIN LATERAL (SELECT id, name FROM items LIMIT 10) i ON true"
+)
+_UPDATE_ONE_ITEM = text("UPDATE items SET description = 'updated' WHERE id = (SELECT id FROM items LIMIT 1)")
+_INSERT_TEST_ITEM = text("INSERT INTO items (name, description) VALUES ('test', 'test item')")
+
+
+def _update_one_item(db) -> int:
+    # Try to update a row - this will be blocked if rows are locked with SELECT FOR UPDATE
+    result = db.execute(_UPDATE_ONE_ITEM)
+    if result.rowcount == 0:
+        # Empty table: insert a test row and update that
+        db.execute(_INSERT_TEST_ITEM)
+        result = db.execute(_UPDATE_ONE_ITEM)
+    db.commit()
+    return result.rowcount
 
 
 @router.get("/test/items")
-async def test_items_query():
+def test_items_query(db: Session = Depends(get_db)):
     """
     Test endpoint that queries the items table.
     Useful for testing table_lock type - ACCESS EXCLUSIVE locks block all operations.
     """
     try:
-        from ..core.database import get_session_local, get_engine
-        session_local_cls = get_session_local()
-        engine = get_engine()
-        db = session_local_cls()
-        try:
-            _ensure_items_table(db, engine)
-            
-            # Query the items table - this will be blocked by ACCESS EXCLUSIVE lock
-            result = db.execute(text("SELECT COUNT(*) as count FROM items"))
-            row = result.fetchone()
-            count = row[0] if row else 0
-            
-            result = db.execute(text("SELECT id, name FROM items LIMIT 10"))
-            items = [{"id": r[0], "name": r[1]} for r in result.fetchall()]
-            
-            return {
-                "status": "success",
-                "count": count,
-                "items": items,
-                "message": "Successfully queried items table",
-                "lock_type_tested": "table_lock"
-            }
-        finally:
-            db.close()
+        # Query the items table - this will be blocked by ACCESS EXCLUSIVE lock
+        rows = _with_items_table(db, lambda db: db.execute(_ITEMS_QUERY).fetchall())
+        count = rows[0][0] if rows else 0
+        items = [{"id": r[1], "name": r[2]} for r in rows if r[1] is not None]
+        
+        return {
+            "status": "success",
+            "count": count,
+            "items": items,
+            "message": "Successfully queried items table",
+            "lock_type_tested": "table_lock"
+        }
     except Exception as e:
-        error_str = str(e).lower()
-        if "timeout" in error_str or "pool" in error_str:
+        kinds = _db_error_kinds(e)
+        if "timeout" in kinds:
             return {
                 "status": "timeout",
                 "error": "Database connection timeout",
                 "details": "This may indicate connection pool exhaustion or a lock"
             }
-        elif "lock" in error_str or "waiting" in error_str or "blocked" in error_str:
+        elif "blocked" in kinds:
             return {
                 "status": "blocked",
                 "error": "Query blocked by lock (likely long-running transaction)",
@@ -147,51 +277,29 @@ async def test_items_query():
 
 
 @router.get("/test/items/update")
-async def test_items_update():
+def test_items_update(db: Session = Depends(get_db)):
     """
     Test endpoint that updates rows in the items table.
     Useful for testing row_lock type - SELECT FOR UPDATE blocks updates to locked rows.
     """
     try:
-        from ..core.database import get_session_local, get_engine
-        session_local_cls = get_session_local()
-        engine = get_engine()
-        db = session_local_cls()
-        try:
-            _ensure_items_table(db, engine)
-            
-            # First, ensure we have at least one row to update
-            result = db.execute(text("SELECT COUNT(*) FROM items"))
-            count = result.fetchone()[0]
-            
-            if count == 0:
-                # Insert a test row
-                db.execute(text("INSERT INTO items (name, description) VALUES ('test', 'test item')"))
-                db.commit()
-            
-            # Try to update a row - this will be blocked if rows are locked with SELECT FOR UPDATE
-            result = db.execute(
-                text("UPDATE items SET description = 'updated' WHERE id = (SELECT id FROM items LIMIT 1)")
-            )
-            db.commit()
-            
-            return {
-                "status": "success",
-                "rows_updated": result.rowcount,
-                "message": "Successfully updated items table",
-                "lock_type_tested": "row_lock"
-            }
-        finally:
-            db.close()
+        rows_updated = _with_items_table(db, _update_one_item)
+        
+        return {
+            "status": "success",
+            "rows_updated": rows_updated,
+            "message": "Successfully updated items table",
+            "lock_type_tested": "row_lock"
+        }
     except Exception as e:
-        error_str = str(e).lower()
-        if "timeout" in error_str or "pool" in error_str:
+        kinds = _db_error_kinds(e)
+        if "timeout" in kinds:
             return {
                 "status": "timeout",
                 "error": "Database connection timeout",
                 "details": "This may indicate connection pool exhaustion or a lock"
             }
-        elif "lock" in error_str or "waiting" in error_str or "blocked" in error_str:
+        elif "blocked" in kinds:
             return {
                 "status": "blocked",
                 "error": "Update blocked by row lock (SELECT FOR UPDATE)",
@@ -205,44 +313,38 @@ async def test_items_update():
 
 
 @router.get("/test/advisory-lock")
-async def test_advisory_lock(lock_id: int = 12345):
+def test_advisory_lock(lock_id: int = 12345, db: Session = Depends(get_db)):
     """
     Test endpoint that attempts to acquire an advisory lock.
     Useful for testing advisory_lock type - pg_advisory_lock blocks other advisory lock attempts.
     """
     try:
-        from ..core.database import get_session_local
-        session_local_cls = get_session_local()
-        db = session_local_cls()
-        try:
-            # Try to acquire advisory lock - this will be blocked if another session holds it
-            result = db.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id})
-            acquired = result.fetchone()[0]
-            
-            if acquired:
-                # Release it immediately
-                db.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
-                db.commit()
-                return {
-                    "status": "success",
-                    "lock_acquired": True,
-                    "message": "Successfully acquired and released advisory lock",
-                    "lock_type_tested": "advisory_lock",
-                    "lock_id": lock_id
-                }
-            else:
-                return {
-                    "status": "blocked",
-                    "lock_acquired": False,
-                    "message": "Advisory lock is held by another session",
-                    "lock_type_tested": "advisory_lock",
-                    "lock_id": lock_id
-                }
-        finally:
-            db.close()
+        # Try to acquire advisory lock - this will be blocked if another session holds it
+        result = db.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id})
+        acquired = result.fetchone()[0]
+        
+        if acquired:
+            # Release it immediately
+            db.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+            db.commit()
+            return {
+                "status": "success",
+                "lock_acquired": True,
+                "message": "Successfully acquired and released advisory lock",
+                "lock_type_tested": "advisory_lock",
+                "lock_id": lock_id
+            }
+        else:
+            return {
+                "status": "blocked",
+                "lock_acquired": False,
+                "message": "Advisory lock is held by another session",
+                "lock_type_tested": "advisory_lock",
+                "lock_id": lock_id
+            }
     except Exception as e:
-        error_str = str(e).lower()
-        if "timeout" in error_str or "pool" in error_str:
+        kinds = _db_error_kinds(e)
+        if "timeout" in kinds:
             return {
                 "status": "timeout",
                 "error": "Database connection timeout",
@@ -256,17 +358,38 @@ async def test_advisory_lock(lock_id: int = 12345):
 
 
 
+# (epoch second, ISO-8601 string) of the last timestamp handed out; callers within
+# the same second share the string. One tuple, so threads never see a torn pair.
+_last_iso_timestamp = (0, "")
+
+
+def _now_iso() -> str:
+    """Current UTC time as ISO-8601, at second resolution."""
+    global _last_iso_timestamp
+    now = int(time.time())
+    second, iso = _last_iso_timestamp
+    if now != second:
+        iso = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        _last_iso_timestamp = (now, iso)
+    return iso
+
+
 @router.get("/metrics")
-async def metrics_endpoint():
+def metrics_endpoint():
     """
     Observability metrics endpoint
     Returns aggregated metrics that require analysis to diagnose issues.
     This mimics what agents would see in Prometheus/Grafana.
+
+    A plain def so it runs in the threadpool: a stale system metrics snapshot
+    is resampled inline (under a lock /health may hold), which mustn't
+    happen on the event loop.
     """
-    global _request_times, _error_count, _success_count
+    global _error_count, _success_count
     
-    # Calculate response time statistics
-    avg_response_time = sum(_request_times) / len(_request_times) if _request_times else 0
+    # Calculate response time statistics from one consistent (sum, count) snapshot
+    request_time_sum, request_sample_size = _request_time_stats
+    avg_response_time = request_time_sum / request_sample_size if request_sample_size else 0
     
     # Calculate error rate
     total_requests = _error_count + _success_count
@@ -275,23 +398,23 @@ async def metrics_endpoint():
     # Get pool metrics (sanitized)
     pool_metrics = get_pool_metrics()
     
-    # System resource metrics
-    disk_root = Path.cwd().anchor or "/"
+    # System resource metrics (cached)
+    system_metrics = _get_system_metrics()
     
     return {
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": _now_iso(),
         "application": {
             "avg_response_time_ms": round(avg_response_time, 2),
             "error_rate_percent": round(error_rate, 2),
             "total_requests": total_requests,
-            "request_sample_size": len(_request_times)
+            "request_sample_size": request_sample_size
         },
         "database": pool_metrics,
         "system": {
-            "cpu_percent": psutil.cpu_percent(interval=0.1),
-            "memory_percent": psutil.virtual_memory().percent,
-            "disk_percent": psutil.disk_usage(disk_root).percent,
-            "process_count": len(psutil.pids())
+            "cpu_percent": system_metrics["cpu_percent"],
+            "memory_percent": system_metrics["memory_percent"],
+            "disk_percent": system_metrics["disk_percent"],
+            "process_count": system_metrics["process_count"]
         }
     }
 
@@ -304,25 +427,31 @@ def _get_alembic_config():
     
     cfg = Config(str(alembic_ini_path))
     # Set the database URL from settings
-    from ..core.config import settings
     cfg.set_main_option("sqlalchemy.url", settings.database_url)
     
     return cfg
 
 
+@lru_cache(maxsize=1)
+def _get_head_version():
+    """Head revision of the migration scripts; they only change on deploy."""
+    return ScriptDirectory.from_config(_get_alembic_config()).get_current_head()
+
+
+# NULL if there's no alembic_version table on the search path
+_VERSION_TABLE_EXISTS = text("SELECT to_regclass('alembic_version') IS NOT NULL")
+_CURRENT_VERSION = text("SELECT version_num FROM alembic_version LIMIT 1")
+
+
 @router.get("/migrations/status")
-async def migration_status():
+def migration_status():
     """
     Check the status of database migrations.
     Returns current version, head version, and whether they match.
     This endpoint helps detect migration failures and version mismatches.
     """
     try:
-        from ..core.config import settings
-        from sqlalchemy import inspect as sqlalchemy_inspect
-        
         engine = get_engine()
-        cfg = _get_alembic_config()
         
         # Get current version from database
         current_version = None
@@ -330,13 +459,12 @@ async def migration_status():
         
         try:
             with engine.connect() as conn:
-                # Check if alembic_version table exists
-                inspector = sqlalchemy_inspect(engine)
-                tables = inspector.get_table_names()
-                version_table_exists = "alembic_version" in tables
+                # Check if alembic_version table exists (on this connection,
+                # rather than an inspector listing every table over another one)
+                version_table_exists = conn.execute(_VERSION_TABLE_EXISTS).scalar()
                 
                 if version_table_exists:
-                    result = conn.execute(text("SELECT version_num FROM alembic_version LIMIT 1"))
+                    result = conn.execute(_CURRENT_VERSION)
                     row = result.fetchone()
                     current_version = row[0] if row else None
         except Exception as e:
@@ -353,11 +481,8 @@ async def migration_status():
         # Get head version (latest migration in codebase)
         head_version = None
         try:
-            # Use Alembic's script directory to find head
-            from alembic.script import ScriptDirectory
-            script = ScriptDirectory.from_config(cfg)
-            head_revision = script.get_current_head()
-            head_version = head_revision if head_revision else None
+            # Use Alembic's script directory to find head (cached)
+            head_version = _get_head_version() or None
         except Exception as e:
             # If we can't determine head, that's also a problem
             return {
@@ -394,7 +519,7 @@ async def migration_status():
             "head_version": head_version,
             "is_up_to_date": is_up_to_date,
             "version_table_exists": version_table_exists,
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": _now_iso()
         }
     
     except Exception as e:
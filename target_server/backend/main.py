@@ -2,29 +2,37 @@
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
-from app.core.database import create_tables
-from app.core.rate_limit import rate_limit_middleware, update_rate_limit_config
+from app.core.database import create_tables, get_session_local, warm_pool
+from app.core.rate_limit import RateLimitMiddleware, sweep_idle_ips, update_rate_limit_config
 from app.routes import health, pool, env_test, rate_limit
+import asyncio
 import time
 
 # Create FastAPI app
 app = FastAPI(
     title="Target Server API",
     description="Backend API for the Universal AI Ops Engineer target server",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Rate limiting middleware (applied first, before other middleware)
-@app.middleware("http")
-async def apply_rate_limit(request: Request, call_next):
-    """Apply rate limiting to requests."""
-    return await rate_limit_middleware(request, call_next)
+app.add_middleware(RateLimitMiddleware)
+
+# Probe and scrape endpoints left out of the request metrics, so frequent
+# trivial calls don't drown out real traffic in avg_response_time_ms.
+# /api/v1/health stays in: the chaos scenarios (pool exhaustion, rate limit
+# floods) show up there.
+_UNTRACKED_PATHS = frozenset({"/healthz", "/api/v1/ready", "/api/v1/metrics"})
 
 # Middleware to track request metrics
 @app.middleware("http")
 async def track_metrics(request: Request, call_next):
     """Track request metrics for observability"""
+    if request.scope["path"] in _UNTRACKED_PATHS:
+        return await call_next(request)
     start_time = time.time()
     
     try:
@@ -38,14 +46,14 @@ async def track_metrics(request: Request, call_next):
         
         # Track response time
         duration_ms = (time.time() - start_time) * 1000
-        health._request_times.append(duration_ms)
+        health.record_request_time(duration_ms)
         
         return response
     except Exception:
         # Track errors
         health._error_count += 1
         duration_ms = (time.time() - start_time) * 1000
-        health._request_times.append(duration_ms)
+        health.record_request_time(duration_ms)
         raise
 
 # Add CORS middleware
@@ -66,7 +74,17 @@ app.include_router(rate_limit.router, prefix="/api/v1", tags=["rate_limit"])
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables and rate limiting on startup"""
+    # Build the engine and session factory up front rather than on the first
+    # request (creating the engine doesn't connect, so this is safe with the DB down)
+    get_session_local()
     create_tables()
+    # Fill the connection pool in the background; a slow or unreachable DB
+    # shouldn't hold up startup
+    app.state.pool_warmup_task = asyncio.create_task(asyncio.to_thread(warm_pool))
+    # Keep /health and /metrics system stats fresh without sampling per request
+    app.state.system_metrics_task = asyncio.create_task(health.refresh_system_metrics())
+    # Forget rate limit state for IPs that have gone quiet
+    app.state.rate_limit_sweep_task = asyncio.create_task(sweep_idle_ips())
     # Initialize rate limit config from settings
     update_rate_limit_config(
         enabled=settings.rate_limit_enabled,
@@ -85,11 +103,16 @@ async def healthz():
     return {"status": "ok"}
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=settings.host,
+        port=settings.port,
+        reload=settings.debug,
+        # uvloop has no Windows support; both come with uvicorn[standard]
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=1 if settings.debug else settings.workers,
         log_level="info"
     )
\ No newline at end of file